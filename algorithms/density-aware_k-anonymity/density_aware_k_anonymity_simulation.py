@@ -1,9 +1,92 @@
 import networkx as nx
-import matplotlib.pyplot as plt
+import numpy as np
+import matplotlib
 import random
 import os
-from statistics import mean
-from typing import Dict, List, Set, Tuple
+import sys
+
+# Headless batch runs: render off-screen and never open GUI windows
+HEADLESS = bool(os.environ.get("ADKA_HEADLESS"))
+if HEADLESS:
+    matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from typing import Dict, FrozenSet, List, NamedTuple, Set, Tuple
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; the kernels then run as plain Python
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+# ======================================================================
+# BFS Kernels (CSR adjacency)
+# ======================================================================
+
+@njit(cache=True)
+def _bfs_density(indptr, indices, user_arr, start, depth):
+    """Total users within `depth` hops of `start`."""
+    num_nodes = indptr.shape[0] - 1
+    visited = np.zeros(num_nodes, dtype=np.uint8)
+    queue = np.empty(num_nodes, dtype=np.int32)
+
+    visited[start] = 1
+    queue[0] = start
+    head, tail = 0, 1
+    total_users = 0
+    total_users += user_arr[start]
+
+    # Level-by-level: queue[head:level_end] is the current BFS layer
+    for _ in range(depth):
+        level_end = tail
+        if head == level_end:
+            break
+
+        while head < level_end:
+            current = queue[head]
+            head += 1
+
+            for p in range(indptr[current], indptr[current + 1]):
+                neigh = indices[p]
+                if visited[neigh] == 0:
+                    visited[neigh] = 1
+                    queue[tail] = neigh
+                    tail += 1
+                    total_users += user_arr[neigh]
+
+    return total_users
+
+
+@njit(cache=True)
+def _bfs_expand(indptr, indices, user_arr, start, k):
+    """Grow a BFS region from `start` until it holds `k` users; returns nodes in insertion order."""
+    num_nodes = indptr.shape[0] - 1
+    visited = np.zeros(num_nodes, dtype=np.uint8)
+    queue = np.empty(num_nodes, dtype=np.int32)
+
+    visited[start] = 1
+    queue[0] = start
+    head, tail = 0, 1
+    user_count = 0
+    user_count += user_arr[start]
+
+    while user_count < k and head < tail:
+        current = queue[head]
+        head += 1
+
+        for p in range(indptr[current], indptr[current + 1]):
+            neigh = indices[p]
+            if visited[neigh] == 0:
+                visited[neigh] = 1
+                queue[tail] = neigh
+                tail += 1
+                user_count += user_arr[neigh]
+                if user_count >= k:
+                    break
+
+    return queue[:tail].copy()
 
 
 # ======================================================================
@@ -14,28 +97,70 @@ class SmartCityGraph:
     """
     Represents a smart city using a 2D grid graph.
     Provides node coordinates for realistic plotting.
+
+    With is_grid=True (default) density uses the closed-form grid formulas;
+    is_grid=False treats the city as a general graph and uses the CSR BFS kernels.
     """
 
-    def __init__(self, grid_size: int = 5, num_users: int = 30, seed: int = None):
+    def __init__(self, grid_size: int = 5, num_users: int = 30, seed: int = None, is_grid: bool = True):
         if seed is not None:
             random.seed(seed)
+            np.random.seed(seed)
 
         self.grid_size = grid_size
         self.graph = nx.convert_node_labels_to_integers(nx.grid_2d_graph(grid_size, grid_size))
+        self.is_grid = is_grid  # node = row * grid_size + col, edges to the 4 axis neighbours
+        self.num_nodes = self.graph.number_of_nodes()  # labels are 0..num_nodes-1
         self.num_users = num_users
+        self.version = 0  # bumped whenever user counts change
 
         # Assign simple 2D coordinates for drawing
         self.positions = {node: (node % grid_size, node // grid_size) for node in self.graph.nodes()}
 
         # Populate users
-        self.user_at_node = {node: 0 for node in self.graph.nodes()}
         self._populate_users()
 
+        # Flat CSR adjacency + user counts (avoids NetworkX dict lookups in BFS)
+        self._build_csr()
+
+    def _build_csr(self):
+        # Labels are 0..num_nodes-1 (convert_node_labels_to_integers), so node id == CSR row
+        nodes = range(self.num_nodes)
+        self.indptr = np.zeros(len(nodes) + 1, dtype=np.int32)
+        np.cumsum([self.graph.degree(u) for u in nodes], out=self.indptr[1:])
+        self.indices = np.fromiter(
+            (n for u in nodes for n in self.graph.neighbors(u)),
+            dtype=np.int32,
+            count=self.indptr[-1],
+        )
+
+        # Warm-compile the expansion kernel so the first query isn't charged for it.
+        # _bfs_density only runs for non-grid cities and compiles on first use.
+        _bfs_expand(self.indptr, self.indices, self.user_arr, 0, 1)
+
     def _populate_users(self):
-        nodes = list(self.graph.nodes())
-        for _ in range(self.num_users):
-            n = random.choice(nodes)
-            self.user_at_node[n] += 1
+        # One multinomial draw places every user uniformly at random.
+        # user_arr (indexed by node id) is the single store of per-node counts; it is
+        # read-only outside set_user_count so every change bumps `version`.
+        counts = np.random.multinomial(self.num_users, np.full(self.num_nodes, 1.0 / self.num_nodes))
+        self.user_arr = counts.astype(np.int32)
+        self.user_arr.flags.writeable = False
+        self._user_counts = None
+
+    @property
+    def user_at_node(self) -> Tuple[int, ...]:
+        """Per-node user counts as an immutable tuple (fast scalar indexing), rebuilt after updates."""
+        if self._user_counts is None:
+            self._user_counts = tuple(self.user_arr.tolist())
+        return self._user_counts
+
+    def set_user_count(self, node: int, count: int):
+        """Update the number of users at a node and invalidate derived caches."""
+        self.user_arr.flags.writeable = True
+        self.user_arr[node] = count
+        self.user_arr.flags.writeable = False
+        self._user_counts = None
+        self.version += 1
 
     def neighbors(self, node: int):
         return list(self.graph.neighbors(node))
@@ -48,62 +173,152 @@ class SmartCityGraph:
 class DensityAwareKAnonymityAlgorithm:
     """Implementation of the Density-Aware k-Anonymity logic."""
 
+    DENSITY_LEVELS = ("Sparse", "Medium", "Dense")
+    ADAPTIVE_K_VALUES = (10, 5, 2)  # k for each density level
+    DENSITY_CAP = 10  # every density >= 10 is "Dense"
+
     def __init__(self, city: SmartCityGraph):
         self.city = city
 
+        # Density -> level/k lookup tables, indexed by min(density, DENSITY_CAP)
+        d = np.arange(self.DENSITY_CAP + 1)
+        level = np.where(d < 4, 0, np.where(d < 10, 1, 2))
+        self._label_lut = np.array(self.DENSITY_LEVELS)[level]
+        self._k_lut = np.array(self.ADAPTIVE_K_VALUES)[level]
+
+        # Filled by build_lookup_tables()
+        self.density_map = None
+        self.k_map = None
+        self.region_size_table = None
+
+        # Per-query memo caches, valid for a single city.version
+        self._density_cache: Dict[Tuple[int, int], int] = {}
+        self._region_cache: Dict[Tuple[int, int], FrozenSet[int]] = {}
+        self._cache_version = city.version
+
+    def _sync_caches(self):
+        if self._cache_version != self.city.version:
+            self._density_cache.clear()
+            self._region_cache.clear()
+            self.density_map = None
+            self.k_map = None
+            self.region_size_table = None
+            self._cache_version = self.city.version
+
     # 1. Density Computation --------------------------------------------------
     def compute_local_density(self, node: int, depth: int = 1) -> int:
-        visited = {node}
-        queue = [(node, 0)]
-        total_users = self.city.user_at_node[node]
-
-        while queue:
-            current, d = queue.pop(0)
-            if d == depth:
-                continue
-
-            for neigh in self.city.neighbors(current):
-                if neigh not in visited:
-                    visited.add(neigh)
-                    queue.append((neigh, d + 1))
-                    total_users += self.city.user_at_node[neigh]
+        self._sync_caches()
+        key = (node, depth)
+        if key not in self._density_cache:
+            self._density_cache[key] = self._compute_local_density(node, depth)
+        return self._density_cache[key]
+
+    def _compute_local_density(self, node: int, depth: int) -> int:
+        if self.city.is_grid:
+            return self.compute_local_density_grid(node, depth)
+
+        return int(_bfs_density(self.city.indptr, self.city.indices, self.city.user_arr, node, depth))
+
+    def compute_local_density_grid(self, node: int, depth: int = 1) -> int:
+        """Closed-form density for grid cities: sum users within Manhattan distance `depth`."""
+        g = self.city.grid_size
+        counts = self.city.user_at_node
+        x, y = node % g, node // g
+        total_users = 0
+
+        for dy in range(max(-depth, -y), min(depth, g - 1 - y) + 1):
+            span = depth - abs(dy)
+            row = (y + dy) * g
+            for col in range(max(0, x - span), min(g, x + span + 1)):
+                total_users += counts[row + col]
 
         return total_users
 
     # Density Interpretation ---------------------------------------------------
     def classify_density_level(self, density: int) -> str:
-        if density < 4:
-            return "Sparse"
-        elif density < 10:
-            return "Medium"
-        return "Dense"
+        return str(self._label_lut[min(density, self.DENSITY_CAP)])
 
     # 2. Adaptive k selection --------------------------------------------------
     def select_adaptive_k(self, density: int) -> int:
-        if density < 4:
-            return 10
-        elif density < 10:
-            return 5
-        return 2
+        return int(self._k_lut[min(density, self.DENSITY_CAP)])
 
     # 3. Region expansion ------------------------------------------------------
-    def expand_anonymization_region(self, start_node: int, k: int) -> Set[int]:
-        region = {start_node}
-        queue = [start_node]
-        user_count = self.city.user_at_node[start_node]
-
-        while user_count < k and queue:
-            current = queue.pop(0)
-
-            for neigh in self.city.neighbors(current):
-                if neigh not in region:
-                    region.add(neigh)
-                    queue.append(neigh)
-                    user_count += self.city.user_at_node[neigh]
-                    if user_count >= k:
-                        break
-
-        return region
+    def expand_anonymization_region(self, start_node: int, k: int) -> FrozenSet[int]:
+        """Returns a cached, immutable region."""
+        self._sync_caches()
+        key = (start_node, k)
+        if key not in self._region_cache:
+            self._region_cache[key] = frozenset(self._expansion_order(start_node, k))
+        return self._region_cache[key]
+
+    def _expansion_order(self, start_node: int, k: int) -> List[int]:
+        """BFS region growth; returns region nodes in the order they were added."""
+        return _bfs_expand(self.city.indptr, self.city.indices, self.city.user_arr, start_node, k).tolist()
+
+    def expand_anonymization_region_vec(self, start_node: int, k: int) -> Set[int]:
+        """
+        Ring-by-ring region expansion over the CSR arrays: each step adds a whole
+        BFS layer with boolean masks. Unlike expand_anonymization_region the last
+        ring is not cut short, so the region may hold more than k users.
+        """
+        indptr, indices, users = self.city.indptr, self.city.indices, self.city.user_arr
+        mask = np.zeros(self.city.num_nodes, dtype=bool)
+        mask[start_node] = True
+        frontier = np.array([start_node])
+        user_count = int(users[start_node])
+
+        while user_count < k and frontier.size:
+            # Gather the CSR neighbour slices of every frontier node in one go
+            starts = indptr[frontier]
+            counts = indptr[frontier + 1] - starts
+            offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            neigh = indices[offsets]
+
+            frontier = np.unique(neigh[~mask[neigh]])
+            mask[frontier] = True
+            user_count += int(users[frontier].sum())
+
+        return set(np.flatnonzero(mask).tolist())
+
+    # 4. Precomputed lookup tables ---------------------------------------------
+    def ensure_lookup_tables(self):
+        """Build the lookup tables if missing or stale for the current user counts."""
+        self._sync_caches()
+        if self.density_map is None:
+            self.build_lookup_tables()
+
+    def build_lookup_tables(self):
+        """
+        Precompute the depth-1 density of every node and the region size for
+        every (k, node) pair, so repeated experiment runs are array lookups.
+        """
+        num_nodes = self.city.num_nodes
+        users = self.city.user_arr
+
+        if self.city.is_grid:
+            # Plus-shaped stencil over the zero-padded user grid
+            g = self.city.grid_size
+            padded = np.pad(users.reshape(g, g), 1)
+            density = (
+                padded[1:-1, 1:-1]
+                + padded[:-2, 1:-1] + padded[2:, 1:-1]
+                + padded[1:-1, :-2] + padded[1:-1, 2:]
+            )
+            self.density_map = density.ravel()
+        else:
+            self.density_map = np.array([self.compute_local_density(n) for n in range(num_nodes)])
+        self.k_map = self._k_lut[np.minimum(self.density_map, self.DENSITY_CAP)]
+
+        # A region for a smaller k is a prefix of the region for the largest k,
+        # so one expansion per node yields every table entry.
+        max_k = max(self.ADAPTIVE_K_VALUES)
+        self.region_size_table = {k: np.empty(num_nodes, dtype=np.int32) for k in self.ADAPTIVE_K_VALUES}
+        for node in range(num_nodes):
+            order = self._expansion_order(node, max_k)
+            reached = np.cumsum(users[order])
+            for k in self.ADAPTIVE_K_VALUES:
+                hit = int(np.searchsorted(reached, k))
+                self.region_size_table[k][node] = min(hit + 1, len(order))
 
 
 # ======================================================================
@@ -122,34 +337,46 @@ class DensityAwareKAnonymityExperiment:
         self.k_values: List[int] = []
         self.region_sizes: List[int] = []
 
-    def run_simulation(self):
+    def run_simulation(self, verbose: bool = True):
         print("\n====== Running Density-Aware k-Anonymity Experiment ======\n")
+        self.algorithm.ensure_lookup_tables()
+
+        # Per-run lines are buffered and written once, not flushed run by run
+        lines: List[str] = []
+
         for i in range(self.runs):
-            target = random.choice(list(self.city.graph.nodes()))
+            target = random.randrange(self.city.num_nodes)
 
-            d = self.algorithm.compute_local_density(target)
-            k = self.algorithm.select_adaptive_k(d)
-            region = self.algorithm.expand_anonymization_region(target, k)
+            d = int(self.algorithm.density_map[target])
+            k = int(self.algorithm.k_map[target])
+            region_size = int(self.algorithm.region_size_table[k][target])
 
             self.densities.append(d)
             self.k_values.append(k)
-            self.region_sizes.append(len(region))
+            self.region_sizes.append(region_size)
 
-            print(
-                f"Run {i+1:02d} | Target={target} | Density={d} "
-                f"({self.algorithm.classify_density_level(d)}) | k={k} | Region Size={len(region)}"
-            )
+            if verbose:
+                lines.append(
+                    f"Run {i+1:02d} | Target={target} | Density={d} "
+                    f"({self.algorithm.classify_density_level(d)}) | k={k} | Region Size={region_size}"
+                )
+
+        if verbose and lines:
+            sys.stdout.write("\n".join(lines) + "\n")
 
         print("\n====== Experiment Complete ======\n")
         return self.densities, self.k_values, self.region_sizes
 
     def get_experiment_summary(self):
+        d = np.asarray(self.densities)
+        k = np.asarray(self.k_values)
+        r = np.asarray(self.region_sizes)
         return {
-            "avg_density": mean(self.densities),
-            "avg_k": mean(self.k_values),
-            "avg_region_size": mean(self.region_sizes),
-            "max_region_size": max(self.region_sizes),
-            "min_region_size": min(self.region_sizes)
+            "avg_density": float(d.mean()),
+            "avg_k": float(k.mean()),
+            "avg_region_size": float(r.mean()),
+            "max_region_size": int(r.max()),
+            "min_region_size": int(r.min())
         }
 
 
@@ -157,58 +384,109 @@ class DensityAwareKAnonymityExperiment:
 # Density-Aware k-Anonymity Visualization
 # ======================================================================
 
+class _BaseFigure(NamedTuple):
+    """A cached drawing of the static city, reused across region plots."""
+    graph: nx.Graph  # held so the id(graph) cache key cannot be reused
+    fig: plt.Figure
+    ax: plt.Axes
+    overlays: list  # region/target artists removed before the next plot
+
+
 class DensityAwareKAnonymityViz:
     """Visualization suite for the Density-Aware k-Anonymity results."""
 
+    _base_cache: Dict[int, _BaseFigure] = {}  # keyed by id(city.graph)
+
     @staticmethod
     def ensure_results_folder():
         if not os.path.exists("results"):
             os.makedirs("results")
 
+    @staticmethod
+    def show_and_close(fig):
+        if not HEADLESS:
+            plt.show()
+        plt.close(fig)
+
     @staticmethod
     def plot_density_vs_k(density, k):
         DensityAwareKAnonymityViz.ensure_results_folder()
-        plt.figure()
+        fig = plt.figure()
         plt.scatter(density, k, color="darkblue")
         plt.xlabel("Local Density")
         plt.ylabel("Selected k")
         plt.title("Density-Aware k-Anonymity: Density vs k")
         plt.grid(True)
         plt.savefig("results/density_vs_k.png", dpi=300)
-        plt.show()
+        DensityAwareKAnonymityViz.show_and_close(fig)
 
     @staticmethod
     def plot_k_vs_region_size(k, region_size):
         DensityAwareKAnonymityViz.ensure_results_folder()
-        plt.figure()
+        fig = plt.figure()
         plt.scatter(k, region_size, color="green")
         plt.xlabel("Selected k")
         plt.ylabel("Anonymization Region Size (nodes)")
         plt.title("Density-Aware k-Anonymity: k vs Region Size")
         plt.grid(True)
         plt.savefig("results/k_vs_region_size.png", dpi=300)
-        plt.show()
-
-    @staticmethod
-    def visualize_specific_region(city: SmartCityGraph, region: Set[int], target: int, density: int, k: int):
-        DensityAwareKAnonymityViz.ensure_results_folder()
+        DensityAwareKAnonymityViz.show_and_close(fig)
+
+    @classmethod
+    def _prepare_base(cls, city: SmartCityGraph):
+        """
+        Draw the static city (edges, nodes, labels) once and reuse it for every region plot.
+        The entry is rebuilt if its figure was closed (e.g. its plt.show() window).
+        """
+        key = id(city.graph)
+        entry = cls._base_cache.get(key)
+        if entry is None or not plt.fignum_exists(entry.fig.number):
+            fig, ax = plt.subplots(figsize=(7, 7))
+            nx.draw_networkx_edges(city.graph, city.positions, ax=ax)
+            nx.draw_networkx_nodes(city.graph, city.positions, ax=ax, node_color="lightblue")
+            nx.draw_networkx_labels(city.graph, city.positions, ax=ax)
+            ax.set_axis_off()
+            cls._base_cache[key] = _BaseFigure(city.graph, fig, ax, [])
+        return cls._base_cache[key]
+
+    @classmethod
+    def clear_base_cache(cls):
+        """Close every cached base figure; call once region plotting is done."""
+        for entry in cls._base_cache.values():
+            plt.close(entry.fig)
+        cls._base_cache.clear()
+
+    @classmethod
+    def visualize_specific_region(cls, city: SmartCityGraph, region: Set[int], target: int, density: int, k: int):
+        """
+        Plot a region on the cached base figure for `city`. The figure stays open between
+        calls; callers must call clear_base_cache() when finished.
+        """
+        cls.ensure_results_folder()
 
         pos = city.positions
-        plt.figure(figsize=(7, 7))
-        nx.draw(city.graph, pos, with_labels=True, node_color="lightblue")
+        base = cls._prepare_base(city)
+        fig, ax, overlays = base.fig, base.ax, base.overlays
+
+        # Only the region/target overlay changes between calls
+        for artist in overlays:
+            artist.remove()
+        overlays.clear()
 
         # region nodes (excluding target)
         region_others = [node for node in region if node != target]
-        nx.draw_networkx_nodes(city.graph, pos, nodelist=region_others, node_color="red")
+        if region_others:
+            overlays.append(nx.draw_networkx_nodes(city.graph, pos, nodelist=region_others, node_color="red", ax=ax))
 
         # target node highlighted
-        nx.draw_networkx_nodes(city.graph, pos, nodelist=[target], node_color="yellow")
+        overlays.append(nx.draw_networkx_nodes(city.graph, pos, nodelist=[target], node_color="yellow", ax=ax))
 
-        plt.title(
+        ax.set_title(
             f"Density-Aware k-Anonymity Region\nTarget={target}, Density={density}, k={k}, Region Size={len(region)}"
         )
-        plt.savefig("results/region_visualization.png", dpi=300)
-        plt.show()
+        fig.savefig("results/region_visualization.png", dpi=300)
+        if not HEADLESS:
+            plt.show()
 
 
 # ======================================================================
@@ -234,7 +512,7 @@ def main():
     DensityAwareKAnonymityViz.plot_k_vs_region_size(k_data, size_data)
 
     # 5. Visualize a Sample Run
-    sample_node = random.choice(list(smart_city.graph.nodes()))
+    sample_node = random.randrange(smart_city.num_nodes)
     sample_density = algorithm.compute_local_density(sample_node)
     sample_k = algorithm.select_adaptive_k(sample_density)
     sample_region = algorithm.expand_anonymization_region(sample_node, sample_k)
@@ -242,6 +520,7 @@ def main():
     DensityAwareKAnonymityViz.visualize_specific_region(
         smart_city, sample_region, sample_node, sample_density, sample_k
     )
+    DensityAwareKAnonymityViz.clear_base_cache()
 
 
 if __name__ == "__main__":
@@ -10,10 +10,9 @@ Date: January 2026
 """
 
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.patches import Circle
-import random
 import json
+import argparse
+import bisect
 import math
 from typing import List, Tuple, Dict
 
@@ -25,23 +24,85 @@ from typing import List, Tuple, Dict
 class DifferentialPrivacyLocationObfuscator:
     """Implements differential privacy for location data using Laplace mechanism."""
 
-    def __init__(self, epsilon_values: List[float] = [0.1, 0.5, 1.0, 2.0, 5.0]):
+    # Largest |2u| fed to log1p, so u == -0.5 cannot produce log(0)
+    _U_MAX = np.nextafter(1.0, 0.0)
+
+    def __init__(
+        self,
+        epsilon_values: List[float] = [0.1, 0.5, 1.0, 2.0, 5.0],
+        seed: int = None,
+    ):
         """
         Initialize the differential privacy obfuscator.
 
         Args:
             epsilon_values: List of privacy budget values (smaller = more private)
+            seed: Optional seed for the noise generator
         """
         self.epsilon_values = epsilon_values
         self.sensitivity = 1.0  # L1 sensitivity for location coordinates
+        self.rng = np.random.default_rng(seed)
+        self.noise_pool: Dict[float, np.ndarray] = {}
+        self._u_buf: np.ndarray = None
+
+        # Per-epsilon constants, indexed by position in epsilon_values
+        self.scales = np.array([self.sensitivity / e for e in epsilon_values])
+        self._scale_by_epsilon = dict(zip(epsilon_values, self.scales.tolist()))
+        self.privacy_levels = [
+            PrivacyUtilityAnalyzer.calculate_privacy_level(e)
+            for e in epsilon_values
+        ]
+
+    def prepare_noise(self, n_points: int) -> Dict[float, np.ndarray]:
+        """
+        Pre-draw an (n_points, 2) Laplace noise block for every epsilon.
+
+        The pool is kept on the obfuscator so later passes (e.g. plotting)
+        reuse exactly the noise behind the reported metrics.
+        """
+        self.noise_pool = {
+            epsilon: self._laplace(scale, (n_points, 2))
+            for epsilon, scale in zip(self.epsilon_values, self.scales)
+        }
+        return self.noise_pool
+
+    def laplace_noise(self, epsilon: float, size) -> np.ndarray:
+        """
+        Draw a block of Laplace noise calibrated to epsilon in one call.
+        """
+        scale = self._scale_by_epsilon.get(epsilon)
+        if scale is None:
+            scale = self.sensitivity / epsilon
+        return self._laplace(scale, size)
+
+    def _laplace(self, scale: float, size) -> np.ndarray:
+        """
+        Laplace(0, scale) samples via the inverse CDF of uniform draws.
+
+        The uniforms go into a buffer reused across calls of the same
+        shape; the returned noise is always a fresh array.
+        """
+        shape = (size,) if isinstance(size, (int, np.integer)) else tuple(size)
+        if self._u_buf is None or self._u_buf.shape != shape:
+            self._u_buf = np.empty(shape)
+        u = self._u_buf
+        self.rng.random(out=u)
+        u -= 0.5
+
+        noise = np.abs(u)
+        noise *= 2.0
+        np.minimum(noise, self._U_MAX, out=noise)
+        np.negative(noise, out=noise)
+        np.log1p(noise, out=noise)
+        noise *= np.sign(u)
+        noise *= -scale
+        return noise
 
     def add_laplace_noise(self, value: float, epsilon: float) -> float:
         """
         Add Laplace noise to a single coordinate value.
         """
-        scale = self.sensitivity / epsilon
-        noise = np.random.laplace(0, scale)
-        return value + noise
+        return value + float(self.laplace_noise(epsilon, 1)[0])
 
     def obfuscate_location(
         self, x: float, y: float, epsilon: float
@@ -49,20 +110,65 @@ class DifferentialPrivacyLocationObfuscator:
         """
         Add differential privacy noise to location coordinates.
         """
-        noisy_x = self.add_laplace_noise(x, epsilon)
-        noisy_y = self.add_laplace_noise(y, epsilon)
-        return noisy_x, noisy_y
+        noisy_x, noisy_y = self.batch_obfuscate([(x, y)], epsilon)[0]
+        return float(noisy_x), float(noisy_y)
 
     def batch_obfuscate(
-        self, locations: List[Tuple[float, float]], epsilon: float
-    ) -> List[Tuple[float, float]]:
+        self,
+        locations: np.ndarray,
+        epsilon: float,
+        noise: np.ndarray = None,
+    ) -> np.ndarray:
         """
         Obfuscate multiple locations with the same privacy parameter.
+
+        Accepts an (N, 2) array (or any sequence of (x, y) pairs). If
+        `noise` is given (e.g. from prepare_noise) it is used instead of a
+        fresh draw. Returns an (N, 2) array of noisy coordinates.
         """
-        return [
-            self.obfuscate_location(x, y, epsilon)
-            for x, y in locations
-        ]
+        locs = np.asarray(locations, dtype=np.float64)
+        if noise is None:
+            noise = self.laplace_noise(epsilon, locs.shape)
+        return locs + noise
+
+    def batch_obfuscate_chunked(
+        self,
+        locations: np.ndarray,
+        epsilon: float,
+        chunk_size: int,
+        noise: np.ndarray = None,
+        track_median: bool = True,
+    ) -> Tuple[np.ndarray, Dict[str, float]]:
+        """
+        Obfuscate `chunk_size` rows at a time, feeding each chunk's
+        location errors into a UtilityLossAccumulator.
+
+        Returns the (N, 2) obfuscated array and the utility metrics, the
+        same values calculate_utility_loss gives on the full error array.
+        Without `noise`, Laplace noise is drawn per chunk, so the noise,
+        difference and error temporaries are O(chunk_size). The output
+        array is still full size, and so are the retained errors unless
+        track_median=False (the median is then NaN).
+        """
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size must be at least 1, got {chunk_size}")
+
+        locs = np.asarray(locations, dtype=np.float64)
+        obfuscated = np.empty_like(locs)
+        accumulator = UtilityLossAccumulator(track_median)
+
+        for lo in range(0, len(locs), chunk_size):
+            hi = lo + chunk_size
+            obfuscated[lo:hi] = self.batch_obfuscate(
+                locs[lo:hi],
+                epsilon,
+                None if noise is None else noise[lo:hi],
+            )
+            accumulator.update(
+                np.linalg.norm(obfuscated[lo:hi] - locs[lo:hi], axis=1)
+            )
+
+        return obfuscated, accumulator.finalize()
 
 
 # ---------------------------------------------------------------------
@@ -72,40 +178,45 @@ class DifferentialPrivacyLocationObfuscator:
 class IoTSmartCitySimulator:
     """Simulates IoT devices in a smart city for location privacy testing."""
 
-    def __init__(self, city_size: float = 10.0, num_devices: int = 50):
+    def __init__(
+        self,
+        city_size: float = 10.0,
+        num_devices: int = 50,
+        seed: int = None,
+    ):
         self.city_size = city_size
         self.num_devices = num_devices
-        self.device_locations = self._generate_device_locations()
+        self.rng = np.random.default_rng(seed)
+        # (N, 2) coordinate array used by the simulation; the tuple list is
+        # kept for callers that still expect List[Tuple[float, float]]
+        self.device_locations_np = self._generate_device_locations()
+        self.device_locations = [
+            tuple(loc) for loc in self.device_locations_np.tolist()
+        ]
         self.device_types = self._assign_device_types()
 
-    def _generate_device_locations(self) -> List[Tuple[float, float]]:
-        locations = []
-
-        poi_centers = [
+    def _generate_device_locations(self) -> np.ndarray:
+        poi_centers = np.array([
             (2.0, 2.0),
             (8.0, 3.0),
             (5.0, 7.0),
             (3.0, 8.0),
             (7.0, 8.0),
-        ]
+        ])
 
         clustered_devices = int(0.7 * self.num_devices)
         random_devices = self.num_devices - clustered_devices
 
-        for _ in range(clustered_devices):
-            center = random.choice(poi_centers)
-            x = np.random.normal(center[0], 0.8)
-            y = np.random.normal(center[1], 0.8)
-            x = max(0, min(self.city_size, x))
-            y = max(0, min(self.city_size, y))
-            locations.append((x, y))
+        # Clustered tier: one center pick + one normal draw for all devices
+        idx = self.rng.integers(0, len(poi_centers), size=clustered_devices)
+        clustered = self.rng.normal(poi_centers[idx], 0.8)
+        np.clip(clustered, 0, self.city_size, out=clustered)
 
-        for _ in range(random_devices):
-            x = random.uniform(0, self.city_size)
-            y = random.uniform(0, self.city_size)
-            locations.append((x, y))
+        uniform = self.rng.uniform(
+            0, self.city_size, size=(random_devices, 2)
+        )
 
-        return locations
+        return np.concatenate([clustered, uniform])
 
     def _assign_device_types(self) -> List[str]:
         device_types = [
@@ -116,7 +227,7 @@ class IoTSmartCitySimulator:
             "wearable",
         ]
         weights = [0.4, 0.2, 0.15, 0.15, 0.1]
-        return np.random.choice(
+        return self.rng.choice(
             device_types, size=self.num_devices, p=weights
         ).tolist()
 
@@ -128,6 +239,16 @@ class IoTSmartCitySimulator:
 class PrivacyUtilityAnalyzer:
     """Analyzes privacy-utility tradeoffs."""
 
+    # epsilon >= PRIVACY_THRESHOLDS[i] maps to PRIVACY_LABELS[i + 1]
+    PRIVACY_THRESHOLDS = [0.5, 1.0, 2.0, 5.0]
+    PRIVACY_LABELS = [
+        "Maximum Privacy",
+        "Very High Privacy",
+        "High Privacy",
+        "Medium Privacy",
+        "Low Privacy",
+    ]
+
     @staticmethod
     def calculate_location_error(
         original: Tuple[float, float],
@@ -137,25 +258,86 @@ class PrivacyUtilityAnalyzer:
 
     @staticmethod
     def calculate_privacy_level(epsilon: float) -> str:
-        if epsilon >= 5.0:
-            return "Low Privacy"
-        elif epsilon >= 2.0:
-            return "Medium Privacy"
-        elif epsilon >= 1.0:
-            return "High Privacy"
-        elif epsilon >= 0.5:
-            return "Very High Privacy"
-        else:
-            return "Maximum Privacy"
+        idx = bisect.bisect_right(PrivacyUtilityAnalyzer.PRIVACY_THRESHOLDS, epsilon)
+        return PrivacyUtilityAnalyzer.PRIVACY_LABELS[idx]
 
     @staticmethod
-    def calculate_utility_loss(errors: List[float]) -> Dict[str, float]:
+    def median(errors: np.ndarray) -> float:
+        """
+        Exact median via O(N) selection (np.partition) instead of a full sort.
+        """
+        mid = errors.size // 2
+        if errors.size % 2:
+            return np.partition(errors, mid)[mid]
+        part = np.partition(errors, [mid - 1, mid])
+        return (part[mid - 1] + part[mid]) / 2.0
+
+    @staticmethod
+    def calculate_utility_loss(errors: np.ndarray) -> Dict[str, float]:
+        errors = np.asarray(errors, dtype=np.float64)
+        return {
+            "mean_error": errors.mean(),
+            "median_error": PrivacyUtilityAnalyzer.median(errors),
+            "std_error": errors.std(),
+            "max_error": errors.max(),
+            "min_error": errors.min(),
+        }
+
+
+class UtilityLossAccumulator:
+    """
+    Streaming utility-loss statistics over batches of errors.
+
+    Mean/std are merged per batch (Chan et al. parallel Welford update);
+    min/max are running values. Only the exact median needs the raw
+    errors, so batches are retained only when track_median is True.
+    """
+
+    def __init__(self, track_median: bool = True):
+        self.track_median = track_median
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._batches: List[np.ndarray] = []
+
+    def update(self, batch: np.ndarray):
+        batch = np.asarray(batch, dtype=np.float64).ravel()
+        if batch.size == 0:
+            return
+
+        batch_mean = batch.mean()
+        batch_m2 = np.square(batch - batch_mean).sum()
+        total = self.count + batch.size
+        delta = batch_mean - self.mean
+
+        self.mean += delta * batch.size / total
+        self.m2 += batch_m2 + delta * delta * self.count * batch.size / total
+        self.count = total
+        self.min = min(self.min, batch.min())
+        self.max = max(self.max, batch.max())
+        if self.track_median:
+            self._batches.append(batch)
+
+    def finalize(self) -> Dict[str, float]:
+        if self.count == 0:
+            return dict.fromkeys(
+                ("mean_error", "median_error", "std_error", "max_error", "min_error"),
+                float("nan"),
+            )
+
+        median = (
+            PrivacyUtilityAnalyzer.median(np.concatenate(self._batches))
+            if self.track_median
+            else float("nan")
+        )
         return {
-            "mean_error": np.mean(errors),
-            "median_error": np.median(errors),
-            "std_error": np.std(errors),
-            "max_error": np.max(errors),
-            "min_error": np.min(errors),
+            "mean_error": self.mean,
+            "median_error": median,
+            "std_error": math.sqrt(self.m2 / self.count),
+            "max_error": self.max,
+            "min_error": self.min,
         }
 
 
@@ -163,7 +345,7 @@ class PrivacyUtilityAnalyzer:
 # Simulation
 # ---------------------------------------------------------------------
 
-def run_differential_privacy_simulation():
+def run_differential_privacy_simulation(chunk_size: int = None):
     print("Differential Privacy Location Obfuscation for IoT Smart Cities")
     print("=" * 70)
 
@@ -185,30 +367,44 @@ def run_differential_privacy_simulation():
         "median_errors": [],
         "std_errors": [],
         "utility_metrics": {},
+        "obfuscated": {},
     }
 
-    for epsilon in dp_obfuscator.epsilon_values:
+    original_locations = city_sim.device_locations_np
+    # The chunked path draws its noise per chunk instead of pre-drawing N x 2 per epsilon
+    noise_pool = (
+        dp_obfuscator.prepare_noise(len(original_locations))
+        if chunk_size is None
+        else None
+    )
+
+    for idx, epsilon in enumerate(dp_obfuscator.epsilon_values):
         print(f"\nTesting Differential Privacy with ε = {epsilon}")
 
-        obfuscated_locations = dp_obfuscator.batch_obfuscate(
-            city_sim.device_locations, epsilon
-        )
+        if chunk_size is not None:
+            obfuscated_locations, utility_metrics = (
+                dp_obfuscator.batch_obfuscate_chunked(
+                    original_locations, epsilon, chunk_size
+                )
+            )
+        else:
+            obfuscated_locations = dp_obfuscator.batch_obfuscate(
+                original_locations, epsilon, noise_pool[epsilon]
+            )
 
-        errors = [
-            analyzer.calculate_location_error(orig, obf)
-            for orig, obf in zip(
-                city_sim.device_locations, obfuscated_locations
+            errors = np.linalg.norm(
+                obfuscated_locations - original_locations, axis=1
             )
-        ]
 
-        utility_metrics = analyzer.calculate_utility_loss(errors)
-        privacy_level = analyzer.calculate_privacy_level(epsilon)
+            utility_metrics = analyzer.calculate_utility_loss(errors)
+        privacy_level = dp_obfuscator.privacy_levels[idx]
 
         results["privacy_levels"].append(privacy_level)
         results["mean_errors"].append(utility_metrics["mean_error"])
         results["median_errors"].append(utility_metrics["median_error"])
         results["std_errors"].append(utility_metrics["std_error"])
         results[f"epsilon_{epsilon}"] = utility_metrics
+        results["obfuscated"][epsilon] = obfuscated_locations
 
         print(f" Privacy Level: {privacy_level}")
         print(f" Mean Location Error: {utility_metrics['mean_error']:.3f}")
@@ -228,20 +424,23 @@ def create_privacy_visualizations(
     dp_obfuscator: DifferentialPrivacyLocationObfuscator,
     results: Dict,
 ):
+    # Imported here so headless runs never pay for matplotlib
+    import matplotlib.pyplot as plt
+
     fig1, axes = plt.subplots(2, 3, figsize=(18, 12))
     fig1.suptitle("Differential Privacy Location Obfuscation Comparison")
 
     vis_epsilons = dp_obfuscator.epsilon_values
+    orig_np = city_sim.device_locations_np
 
     for idx, epsilon in enumerate(vis_epsilons):
         ax = axes[idx // 3, idx % 3]
 
-        obfuscated_locs = dp_obfuscator.batch_obfuscate(
-            city_sim.device_locations, epsilon
-        )
+        # Plot the exact points behind the reported errors
+        obfuscated_locs = results["obfuscated"][epsilon]
 
-        orig_x, orig_y = zip(*city_sim.device_locations)
-        obf_x, obf_y = zip(*obfuscated_locs)
+        orig_x, orig_y = orig_np[:, 0], orig_np[:, 1]
+        obf_x, obf_y = obfuscated_locs[:, 0], obfuscated_locs[:, 1]
 
         ax.scatter(orig_x, orig_y, c="blue", alpha=0.7, label="Original")
         ax.scatter(obf_x, obf_y, c="red", alpha=0.7, label="Obfuscated")
@@ -254,7 +453,7 @@ def create_privacy_visualizations(
                 alpha=0.5,
             )
 
-        privacy_level = PrivacyUtilityAnalyzer.calculate_privacy_level(epsilon)
+        privacy_level = dp_obfuscator.privacy_levels[idx]
         mean_error = results["mean_errors"][idx]
 
         ax.set_title(
@@ -275,16 +474,67 @@ def create_privacy_visualizations(
 # Main
 # ---------------------------------------------------------------------
 
-def main():
-    city_sim, dp_obfuscator, results = run_differential_privacy_simulation()
+def _positive_int(value: str) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value!r}")
+    return number
 
-    create_privacy_visualizations(city_sim, dp_obfuscator, results)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Differential privacy location obfuscation simulation"
+    )
+    parser.add_argument(
+        "--plots",
+        action="store_true",
+        help="render and show the visualizations (requires matplotlib)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=_positive_int,
+        default=None,
+        help="obfuscate devices in chunks of this size, streaming the error statistics",
+    )
+    args = parser.parse_args()
+
+    city_sim, dp_obfuscator, results = run_differential_privacy_simulation(
+        chunk_size=args.chunk_size
+    )
+
+    if args.plots:
+        import matplotlib.pyplot as plt
+
+        create_privacy_visualizations(city_sim, dp_obfuscator, results)
+
+    # Numeric series (and per-device obfuscated coordinates) go to a
+    # compressed .npz; the JSON keeps only labels and per-epsilon summaries
+    for key in ("epsilon_values", "mean_errors", "median_errors", "std_errors"):
+        results[key] = np.array(results[key])
+    arrays = {k: v for k, v in results.items() if isinstance(v, np.ndarray)}
+    arrays.update(
+        (f"obfuscated_{epsilon}", obf)
+        for epsilon, obf in results["obfuscated"].items()
+    )
+    np.savez_compressed("dp_results.npz", **arrays)
 
     with open("dp_simulation_results.json", "w") as f:
-        json.dump(results, f, indent=2)
+        json.dump(
+            {
+                k: v
+                for k, v in results.items()
+                if k != "obfuscated" and not isinstance(v, np.ndarray)
+            },
+            f,
+            indent=2,
+        )
 
     print("\nSimulation completed successfully.")
-    plt.show()
+    if args.plots:
+        plt.show()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,155 @@
+"""Checks for the density-aware k-anonymity lookup tables and caches."""
+
+import os
+import sys
+from collections import deque
+from pathlib import Path
+
+import networkx as nx
+import pytest
+
+os.environ.setdefault("ADKA_HEADLESS", "1")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "algorithms" / "density-aware_k-anonymity"))
+
+from density_aware_k_anonymity_simulation import (  # noqa: E402
+    DensityAwareKAnonymityAlgorithm,
+    SmartCityGraph,
+)
+
+CITIES = [
+    (seed, grid_size, num_users)
+    for seed in range(10)
+    for grid_size, num_users in [(5, 30), (7, 10), (4, 80), (6, 3)]
+]
+
+
+def reference_density(city, node, depth=1):
+    """Users within `depth` hops of `node`, by plain BFS over the graph."""
+    visited = {node}
+    queue = deque([(node, 0)])
+    total_users = city.user_at_node[node]
+
+    while queue:
+        current, d = queue.popleft()
+        if d == depth:
+            continue
+        for neigh in city.graph.neighbors(current):
+            if neigh not in visited:
+                visited.add(neigh)
+                queue.append((neigh, d + 1))
+                total_users += city.user_at_node[neigh]
+
+    return total_users
+
+
+def reference_region(city, start, k):
+    """Node-by-node BFS growth until the region holds k users."""
+    region = {start}
+    queue = deque([start])
+    user_count = city.user_at_node[start]
+
+    while user_count < k and queue:
+        current = queue.popleft()
+        for neigh in city.graph.neighbors(current):
+            if neigh not in region:
+                region.add(neigh)
+                queue.append(neigh)
+                user_count += city.user_at_node[neigh]
+                if user_count >= k:
+                    break
+
+    return region
+
+
+@pytest.mark.parametrize("seed, grid_size, num_users", CITIES)
+def test_lookup_tables_match_bfs(seed, grid_size, num_users):
+    city = SmartCityGraph(grid_size=grid_size, num_users=num_users, seed=seed)
+    algorithm = DensityAwareKAnonymityAlgorithm(city)
+    algorithm.build_lookup_tables()
+
+    for node in range(city.num_nodes):
+        density = reference_density(city, node)
+        assert algorithm.density_map[node] == density
+        assert algorithm.k_map[node] == algorithm.select_adaptive_k(density)
+        for k in algorithm.ADAPTIVE_K_VALUES:
+            assert algorithm.region_size_table[k][node] == len(reference_region(city, node, k))
+
+
+@pytest.mark.parametrize("seed, grid_size, num_users", CITIES)
+def test_bfs_density_matches_grid_formula(seed, grid_size, num_users):
+    grid_city = SmartCityGraph(grid_size=grid_size, num_users=num_users, seed=seed)
+    bfs_city = SmartCityGraph(grid_size=grid_size, num_users=num_users, seed=seed, is_grid=False)
+    assert bfs_city.user_at_node == grid_city.user_at_node
+
+    grid_algorithm = DensityAwareKAnonymityAlgorithm(grid_city)
+    bfs_algorithm = DensityAwareKAnonymityAlgorithm(bfs_city)
+
+    for node in range(grid_city.num_nodes):
+        for depth in range(5):
+            expected = grid_algorithm.compute_local_density_grid(node, depth)
+            assert bfs_algorithm.compute_local_density(node, depth) == expected
+            assert expected == reference_density(grid_city, node, depth)
+
+    grid_algorithm.build_lookup_tables()
+    bfs_algorithm.build_lookup_tables()
+    assert (bfs_algorithm.density_map == grid_algorithm.density_map).all()
+    assert (bfs_algorithm.k_map == grid_algorithm.k_map).all()
+
+
+@pytest.mark.parametrize("is_grid", [True, False])
+def test_caches_follow_set_user_count(is_grid):
+    city = SmartCityGraph(grid_size=5, num_users=30, seed=1, is_grid=is_grid)
+    algorithm = DensityAwareKAnonymityAlgorithm(city)
+
+    # Warm every cache before the counts change
+    algorithm.ensure_lookup_tables()
+    for node in range(city.num_nodes):
+        algorithm.compute_local_density(node)
+        algorithm.expand_anonymization_region(node, 5)
+
+    for node, count in [(3, 7), (12, 0), (0, 4), (24, 11)]:
+        city.set_user_count(node, count)
+        assert city.user_at_node[node] == city.user_arr[node] == count
+
+        algorithm.ensure_lookup_tables()
+        for n in range(city.num_nodes):
+            density = reference_density(city, n)
+            assert algorithm.compute_local_density(n) == density
+            assert algorithm.density_map[n] == density
+            assert algorithm.k_map[n] == algorithm.select_adaptive_k(density)
+            assert algorithm.expand_anonymization_region(n, 5) == reference_region(city, n, 5)
+            for k in algorithm.ADAPTIVE_K_VALUES:
+                assert algorithm.region_size_table[k][n] == len(reference_region(city, n, k))
+
+
+def test_user_counts_are_read_only():
+    city = SmartCityGraph(grid_size=4, num_users=10, seed=0)
+    with pytest.raises(TypeError):
+        city.user_at_node[0] = 5
+    with pytest.raises(ValueError):
+        city.user_arr[0] = 5
+
+    algorithm = DensityAwareKAnonymityAlgorithm(city)
+    assert isinstance(algorithm.expand_anonymization_region(0, 5), frozenset)
+
+
+@pytest.mark.parametrize("seed, grid_size, num_users", CITIES)
+def test_ring_expansion_adds_whole_bfs_layers(seed, grid_size, num_users):
+    city = SmartCityGraph(grid_size=grid_size, num_users=num_users, seed=seed)
+    algorithm = DensityAwareKAnonymityAlgorithm(city)
+
+    for start in range(city.num_nodes):
+        hops = nx.single_source_shortest_path_length(city.graph, start)
+        for k in (0, 1, 2, 5, 10, 1000):
+            region = algorithm.expand_anonymization_region_vec(start, k)
+            assert region >= algorithm.expand_anonymization_region(start, k)
+
+            # The region is every node within some radius of start...
+            radius = max(hops[n] for n in region)
+            assert region == {n for n, d in hops.items() if d <= radius}
+
+            # ...and that radius is the first one whose layers reach k users
+            users = sum(city.user_at_node[n] for n in region)
+            inner = sum(city.user_at_node[n] for n, d in hops.items() if d < radius)
+            assert radius == 0 or inner < k
+            assert users >= k or len(region) == len(hops)
@@ -0,0 +1,78 @@
+"""Checks for the differential privacy obfuscator and utility statistics."""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "algorithms" / "differential_privacy"))
+
+from differential_privacy_simulation import (  # noqa: E402
+    DifferentialPrivacyLocationObfuscator,
+    PrivacyUtilityAnalyzer,
+    UtilityLossAccumulator,
+)
+
+N_POINTS = 1001
+
+
+@pytest.mark.parametrize("chunk_size", [0, -1])
+def test_chunked_obfuscation_rejects_non_positive_chunk_size(chunk_size):
+    obfuscator = DifferentialPrivacyLocationObfuscator(seed=0)
+    with pytest.raises(ValueError):
+        obfuscator.batch_obfuscate_chunked(np.zeros((5, 2)), 1.0, chunk_size)
+
+
+@pytest.fixture
+def locations():
+    return np.random.default_rng(1).uniform(0, 10, size=(N_POINTS, 2))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 250, N_POINTS, N_POINTS + 5])
+def test_chunked_obfuscation_matches_one_shot(locations, chunk_size):
+    obfuscator = DifferentialPrivacyLocationObfuscator(seed=3)
+    noise = obfuscator.prepare_noise(N_POINTS)[1.0]
+
+    expected_obfuscated = obfuscator.batch_obfuscate(locations, 1.0, noise)
+    expected = PrivacyUtilityAnalyzer.calculate_utility_loss(
+        np.linalg.norm(expected_obfuscated - locations, axis=1)
+    )
+
+    obfuscated, metrics = obfuscator.batch_obfuscate_chunked(
+        locations, 1.0, chunk_size, noise
+    )
+
+    np.testing.assert_array_equal(obfuscated, expected_obfuscated)
+    assert metrics.keys() == expected.keys()
+    for key, value in expected.items():
+        assert metrics[key] == pytest.approx(value)
+
+
+@pytest.mark.parametrize("chunk_size", [7, 64])
+def test_chunked_obfuscation_with_per_chunk_noise(locations, chunk_size):
+    obfuscator = DifferentialPrivacyLocationObfuscator(seed=5)
+    obfuscated, metrics = obfuscator.batch_obfuscate_chunked(
+        locations, 0.5, chunk_size
+    )
+    expected = PrivacyUtilityAnalyzer.calculate_utility_loss(
+        np.linalg.norm(obfuscated - locations, axis=1)
+    )
+    for key, value in expected.items():
+        assert metrics[key] == pytest.approx(value)
+
+    _, untracked = obfuscator.batch_obfuscate_chunked(
+        locations, 0.5, chunk_size, track_median=False
+    )
+    assert np.isnan(untracked["median_error"])
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 10, 51, 1000])
+def test_median_matches_numpy(size):
+    errors = np.random.default_rng(size).random(size)
+    assert PrivacyUtilityAnalyzer.median(errors) == pytest.approx(np.median(errors))
+
+
+def test_empty_accumulator_reports_nan():
+    metrics = UtilityLossAccumulator().finalize()
+    assert all(np.isnan(value) for value in metrics.values())
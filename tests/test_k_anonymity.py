@@ -0,0 +1,75 @@
+"""Numerical checks for the compiled k-anonymity kernels."""
+
+import math
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "algorithms" / "k_anonymity"))
+
+from k_anonymity_simulation import (  # noqa: E402
+    KAnonymityPrivacyManager,
+    PrivacyAnalyzer,
+    SmartCityGraph,
+    batch_kanon,
+)
+
+K_VALUES = [1, 2, 3, 5, 7, 1000]
+
+
+@pytest.fixture
+def city():
+    city = SmartCityGraph(grid_size=8, seed=42)
+    city.add_users(25)
+    return city
+
+
+def test_kanon_one_matches_get_anonymized_location(city):
+    for k in K_VALUES:
+        manager = KAnonymityPrivacyManager(city, k)
+        for user_id in range(len(city.users)):
+            cx, cy, region_size, success = manager.anonymize(user_id)
+            anon_x, anon_y, region_nodes, users = manager.get_anonymized_location(user_id)
+
+            assert success == (len(users) >= k)
+            if success:
+                assert math.isclose(cx, anon_x)
+                assert math.isclose(cy, anon_y)
+                assert math.isclose(
+                    region_size,
+                    PrivacyAnalyzer.calculate_region_size(region_nodes, city)
+                )
+            else:
+                assert math.isnan(cx) and math.isnan(cy) and region_size == 0.0
+
+
+def test_kanon_one_matches_batch_kanon(city):
+    num_users = len(city.users)
+    starts = np.array([city.users[u] for u in range(num_users)], dtype=np.int32)
+    node_user_indptr, node_user_indices = city.user_index()
+    centroids, region_sizes, success = batch_kanon(
+        starts,
+        np.array(K_VALUES, dtype=np.int64),
+        city.adj_indptr,
+        city.adj_indices,
+        node_user_indptr,
+        node_user_indices,
+        city.node_pos
+    )
+
+    for j, k in enumerate(K_VALUES):
+        manager = KAnonymityPrivacyManager(city, k)
+        results = np.array([manager.anonymize(u) for u in range(num_users)])
+
+        np.testing.assert_allclose(results[:, :2], centroids[:, j])
+        np.testing.assert_allclose(results[:, 2], region_sizes[:, j])
+        np.testing.assert_array_equal(results[:, 3].astype(bool), success[:, j])
+
+
+def test_kanon_one_clears_scratch_buffer(city):
+    manager = KAnonymityPrivacyManager(city, 5)
+    for user_id in range(len(city.users)):
+        manager.anonymize(user_id)
+        assert not manager._in_region.any()